@@ -5,16 +5,27 @@ Automated Mobile App Testing Agent Package
 __version__ = "1.0.0"
 __author__ = "Hasib Nirjhar"
 
-from .emulator_manager import EmulatorManager
-from .apk_installer import APKInstaller
-from .ui_explorer import UIExplorer
-from .test_executor import TestExecutor
-from .report_generator import ReportGenerator
+import importlib
 
-__all__ = [
-    'EmulatorManager',
-    'APKInstaller',
-    'UIExplorer',
-    'TestExecutor',
-    'ReportGenerator'
-]
\ No newline at end of file
+# Components are imported on first access (PEP 562), so importing one
+# submodule doesn't pull in every other component and its dependencies
+_components = {
+    'EmulatorManager': '.emulator_manager',
+    'APKInstaller': '.apk_installer',
+    'UIExplorer': '.ui_explorer',
+    'TestExecutor': '.test_executor',
+    'ReportGenerator': '.report_generator'
+}
+
+__all__ = list(_components)
+
+def __getattr__(name):
+    if name in _components:
+        module = importlib.import_module(_components[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -2,25 +2,65 @@
 APK Installer - Handles APK installation and app management
 """
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pathlib import Path
+import hashlib
+import json
 import time
 import re
 from loguru import logger
 
+from .utils import AdbShell, wait_until
+
+# `aapt dump badging` fields
+_RE_PKG = re.compile(rb"package: name='([^']+)'")
+_RE_ACT = re.compile(rb"launchable-activity: name='([^']+)'")
+
+# Parsed APK metadata, keyed by APK SHA-256
+_AAPT_CACHE_DIR = Path(".aapt_cache")
+
+# `am start -W` fields
+_RE_STATUS = re.compile(r"Status: (\w+)")
+_RE_TOTAL_TIME = re.compile(r"TotalTime: (\d+)")
+
 class APKInstaller:
     def __init__(self, config):
         self.config = config
         self.device_id = config['adb']['device_id']
+        self._adb_prefix = ("adb", "-s", self.device_id)
         self.package_name = None
         self.main_activity = None
+        self.shell = AdbShell(self._adb_prefix)
+        self._badging = None  # (apk_path, `aapt dump badging` stdout bytes)
+        self._prepared_apk = None
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        self._warmup_future = None
+        self._warmup_cancel = threading.Event()  # set to stop warm-up between steps
+    
+    def _run_adb(self, *args, timeout=10):
+        """Run a host-side adb command against this device"""
+        return subprocess.run(
+            self._adb_prefix + args,
+            capture_output=True,
+            encoding="utf-8",
+            errors="ignore",
+            timeout=timeout
+        )
+    
+    def prepare(self, apk_path):
+        """Read package name and main activity from the APK (no device needed)"""
+        self.package_name, self.main_activity = self._parse_apk(apk_path)
+        self._prepared_apk = apk_path
     
     def install(self, apk_path):
         """Install APK on device"""
         logger.info(f"Installing APK: {apk_path}")
         
         try:
-            # Get package info before installation
-            self.package_name = self._get_package_name(apk_path)
-            self.main_activity = self._get_main_activity(apk_path)
+            # Get package info before installation, unless prepare() already did
+            if self._prepared_apk != apk_path:
+                self.prepare(apk_path)
             
             logger.info(f"Package: {self.package_name}")
             logger.info(f"Main Activity: {self.main_activity}")
@@ -28,26 +68,29 @@ class APKInstaller:
             # Uninstall if already exists
             self.uninstall()
             
-            # Install APK
-            result = subprocess.run(
-                ["adb", "-s", self.device_id, "install", "-r", apk_path],
-                capture_output=True,
-                encoding="utf-8",
-                errors="ignore",
-                text=True,
-                timeout=120
-            )
+            # Install APK; -g grants every runtime permission in the manifest
+            # and -t allows test-only builds
+            result = self._run_adb("install", "-r", "-t", "-g", apk_path, timeout=120)
+            
+            # pm before Android 6.0 rejects -g; install without it and grant
+            # permissions one by one instead
+            granted = True
+            if "Success" not in result.stdout and "-g" in result.stdout + result.stderr:
+                logger.info("Device does not support install -g, retrying without it")
+                result = self._run_adb("install", "-r", "-t", apk_path, timeout=120)
+                granted = False
             
             if "Success" in result.stdout:
                 logger.info("APK installed successfully")
-                time.sleep(2)
                 
-                # Grant permissions immediately
-                self.grant_permissions()
+                if not granted:
+                    self.grant_permissions()
                 
-                # Perform warm-up launches to prevent first-run crashes
+                # Perform warm-up launches to prevent first-run crashes; they
+                # run in the background until the app is first launched or stopped
                 logger.info("Performing warm-up launches to stabilize app...")
-                self._warmup_app()
+                self._warmup_cancel.clear()
+                self._warmup_future = self._executor.submit(self._warmup_app)
                 
                 return True
             else:
@@ -60,33 +103,51 @@ class APKInstaller:
     
     def _warmup_app(self):
         """Launch app multiple times to warm up and prevent first-run issues"""
+        cancelled = self._warmup_cancel.is_set
+        
         for i in range(2):
+            if cancelled():
+                logger.info("App warm-up cancelled")
+                return
+            
             logger.info(f"Warm-up launch {i + 1}/2...")
             try:
                 component = f"{self.package_name}/{self.main_activity}"
-                subprocess.run(
-                    ["adb", "-s", self.device_id, "shell", "am", "start", "-n", component],
-                    capture_output=True,
-                    encoding="utf-8",
-                    errors="ignore",
-                    timeout=30
-                )
-                time.sleep(5)
+                self.shell.run(f"am start -n {component}", timeout=30)
+                wait_until(lambda: cancelled() or self._is_app_running(), 5)
                 
-                # Stop the app
-                subprocess.run(
-                    ["adb", "-s", self.device_id, "shell", "am", "force-stop", self.package_name],
-                    capture_output=True,
-                    encoding="utf-8",
-                    errors="ignore",
-                    timeout=10
-                )
-                time.sleep(2)
+                # Stop the app, unless a real launch has taken over meanwhile
+                if cancelled():
+                    logger.info("App warm-up cancelled")
+                    return
+                self.shell.run(f"am force-stop {self.package_name}")
+                wait_until(lambda: cancelled() or not self._is_app_running(), 2)
             except Exception as e:
                 logger.warning(f"Warm-up {i + 1} failed: {str(e)}")
         
         logger.info("App warm-up complete")
     
+    def _wait_for_warmup(self):
+        """Block until background warm-up launches have finished"""
+        if self._warmup_future is None:
+            return
+        
+        try:
+            self._warmup_future.result(timeout=30)
+        except FutureTimeoutError:
+            # Stop it at the next step and wait for the step in flight, so a
+            # late force-stop cannot kill the launch that follows
+            logger.warning("Warm-up is taking too long, cancelling it")
+            self._warmup_cancel.set()
+            try:
+                self._warmup_future.result()
+            except Exception as e:
+                logger.warning(f"Warm-up did not finish cleanly: {str(e)}")
+        except Exception as e:
+            logger.warning(f"Warm-up did not finish cleanly: {str(e)}")
+        finally:
+            self._warmup_future = None
+    
     def uninstall(self):
         """Uninstall app from device"""
         if not self.package_name:
@@ -95,13 +156,7 @@ class APKInstaller:
         logger.info(f"Uninstalling: {self.package_name}")
         
         try:
-            subprocess.run(
-                ["adb", "-s", self.device_id, "uninstall", self.package_name],
-                capture_output=True,
-                encoding="utf-8",
-                errors="ignore",
-                timeout=30
-            )
+            self._run_adb("uninstall", self.package_name, timeout=30)
         except Exception as e:
             logger.warning(f"Uninstall warning: {str(e)}")
     
@@ -111,6 +166,8 @@ class APKInstaller:
             logger.error("Package name or main activity not set")
             return False
         
+        self._wait_for_warmup()
+        
         logger.info(f"Launching app: {self.package_name}")
         
         max_retries = 3
@@ -123,30 +180,18 @@ class APKInstaller:
                 # Clear app data on first attempt to prevent state issues
                 if attempt == 0:
                     logger.info("Clearing app data for clean start...")
-                    subprocess.run(
-                        ["adb", "-s", self.device_id, "shell", "pm", "clear", self.package_name],
-                        capture_output=True,
-                        encoding="utf-8",
-                        errors="ignore",
-                        timeout=10
-                    )
+                    self.shell.run(f"pm clear {self.package_name}")
                     time.sleep(1)
                 
                 component = f"{self.package_name}/{self.main_activity}"
-                result = subprocess.run(
-                    ["adb", "-s", self.device_id, "shell", "am", "start", "-n", component],
-                    capture_output=True,
-                    encoding="utf-8",
-                    errors="ignore",
-                    text=True,
-                    timeout=30
-                )
+                # -W blocks until the launched activity has drawn its first frame
+                result = self.shell.run(f"am start -W -n {component}", timeout=30)
                 
-                # Wait for app to launch
-                time.sleep(5)
-                
-                # Verify app is running
-                if self._is_app_running():
+                status = _RE_STATUS.search(result.stdout)
+                if status and status.group(1) == "ok":
+                    total_time = _RE_TOTAL_TIME.search(result.stdout)
+                    if total_time:
+                        logger.debug(f"Launch took {total_time.group(1)} ms")
                     logger.info(f"App launched successfully (attempt {attempt + 1})")
                     return True
                 else:
@@ -166,31 +211,12 @@ class APKInstaller:
     def _is_app_running(self):
         """Check if app is currently running"""
         try:
-            result = subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "pidof", self.package_name],
-                capture_output=True,
-                encoding="utf-8",
-                errors="ignore",
-                text=True,
-                timeout=5
-            )
+            result = self.shell.run(f"pidof {self.package_name}", timeout=5)
             
-            # If pidof returns a number, app is running
-            if result.stdout.strip() and result.stdout.strip().isdigit():
-                return True
-            
-            # Fallback: check running processes
-            result = subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "ps | grep", self.package_name],
-                capture_output=True,
-                text=True,
-                timeout=5,
-                encoding="utf-8",
-                errors="ignore",
-                shell=True
-            )
-            
-            return self.package_name in result.stdout
+            # pidof prints one pid per matching process (several for
+            # multi-process apps) and nothing when the app isn't running
+            pids = result.stdout.split()
+            return bool(pids) and all(pid.isdigit() for pid in pids)
             
         except Exception:
             return False
@@ -200,34 +226,76 @@ class APKInstaller:
         if not self.package_name:
             return
         
+        self._wait_for_warmup()
+        
         logger.info(f"Stopping app: {self.package_name}")
         
         try:
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "am", "force-stop", self.package_name],
-                capture_output=True,
-                encoding="utf-8",
-                errors="ignore",
-                timeout=10
-            )
+            self.shell.run(f"am force-stop {self.package_name}")
         except Exception as e:
             logger.warning(f"Stop warning: {str(e)}")
     
+    def close(self):
+        """Close the persistent adb shell session and background workers"""
+        self._wait_for_warmup()
+        self._executor.shutdown(wait=False)
+        self.shell.close()
+    
+    def _parse_apk(self, apk_path):
+        """Get (package name, main activity), reusing cached results for unchanged APKs"""
+        cache_file = _AAPT_CACHE_DIR / f"{self._hash_apk(apk_path)}.json"
+        
+        try:
+            cached = json.loads(cache_file.read_text(encoding="utf-8"))
+            return cached['package_name'], cached['main_activity']
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        package_name = self._get_package_name(apk_path)
+        main_activity = self._get_main_activity(apk_path)
+        
+        if package_name and main_activity:
+            try:
+                _AAPT_CACHE_DIR.mkdir(exist_ok=True)
+                cache_file.write_text(json.dumps({
+                    'package_name': package_name,
+                    'main_activity': main_activity
+                }), encoding="utf-8")
+            except OSError as e:
+                logger.warning(f"Could not cache APK info: {str(e)}")
+        
+        return package_name, main_activity
+    
+    @staticmethod
+    def _hash_apk(apk_path):
+        """SHA-256 of the APK file contents"""
+        digest = hashlib.sha256()
+        with open(apk_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _dump_badging(self, apk_path):
+        """Run `aapt dump badging` once per APK and cache its raw output"""
+        if self._badging and self._badging[0] == apk_path:
+            return self._badging[1]
+        
+        # Kept as bytes: only the two short regex matches are ever decoded
+        result = subprocess.run(
+            ["aapt", "dump", "badging", apk_path],
+            capture_output=True,
+            timeout=30
+        )
+        
+        self._badging = (apk_path, result.stdout)
+        return result.stdout
+    
     def _get_package_name(self, apk_path):
         """Extract package name from APK"""
         try:
-            result = subprocess.run(
-                ["aapt", "dump", "badging", apk_path],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="ignore",
-                timeout=30
-            )
-            
-            match = re.search(r"package: name='([^']+)'", result.stdout)
+            match = _RE_PKG.search(self._dump_badging(apk_path))
             if match:
-                return match.group(1)
+                return match.group(1).decode("utf-8", "ignore")
             
             logger.error("Could not extract package name")
             return None
@@ -258,18 +326,9 @@ class APKInstaller:
     def _get_main_activity(self, apk_path):
         """Extract main activity from APK"""
         try:
-            result = subprocess.run(
-                ["aapt", "dump", "badging", apk_path],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="ignore",
-                timeout=30
-            )
-            
-            match = re.search(r"launchable-activity: name='([^']+)'", result.stdout)
+            match = _RE_ACT.search(self._dump_badging(apk_path))
             if match:
-                return match.group(1)
+                return match.group(1).decode("utf-8", "ignore")
             
             logger.error("Could not extract main activity")
             return None
@@ -294,15 +353,11 @@ class APKInstaller:
             "android.permission.RECORD_AUDIO"
         ]
         
-        for permission in permissions:
-            try:
-                subprocess.run(
-                    ["adb", "-s", self.device_id, "shell", "pm", "grant", 
-                     self.package_name, permission],
-                    capture_output=True,
-                    encoding="utf-8",
-                    errors="ignore",
-                    timeout=5
-                )
-            except Exception:
-                pass  # Permission might not be needed
\ No newline at end of file
+        # One round-trip for all grants; joined with ';' so a permission the
+        # app doesn't declare only fails its own `pm grant`
+        script = "; ".join(f"pm grant {self.package_name} {p}" for p in permissions)
+        
+        try:
+            self.shell.run(script, timeout=10)
+        except Exception as e:
+            logger.warning(f"Grant permissions warning: {str(e)}")
\ No newline at end of file
@@ -2,10 +2,13 @@
 Emulator Manager - Handles Android emulator lifecycle
 """
 import subprocess
+import select
 import time
 import os
 from loguru import logger
 
+from .utils import wait_until
+
 class EmulatorManager:
     def __init__(self, config):
         self.config = config
@@ -13,10 +16,12 @@ class EmulatorManager:
         self.port = config['emulator']['port']
         self.wait_timeout = config['emulator']['wait_timeout']
         self.process = None
+        self._running_cache = (0.0, False)  # (monotonic timestamp, is_running)
         
     def start(self):
         """Start the Android emulator"""
         logger.info(f"Starting emulator: {self.emulator_name}")
+        self._running_cache = (0.0, False)
         
         try:
             # Check if emulator already running
@@ -58,6 +63,7 @@ class EmulatorManager:
     def stop(self):
         """Stop the Android emulator"""
         logger.info("Stopping emulator...")
+        self._running_cache = (0.0, False)
         
         try:
             # Kill using ADB
@@ -70,7 +76,7 @@ class EmulatorManager:
             # Kill process if still running
             if self.process:
                 self.process.terminate()
-                self.process.wait(timeout=10)
+                self._wait_for_exit(timeout=10)
             
             logger.info("Emulator stopped")
             return True
@@ -79,8 +85,33 @@ class EmulatorManager:
             logger.error(f"Failed to stop emulator: {str(e)}")
             return False
     
+    def _wait_for_exit(self, timeout):
+        """Wait for the emulator process to exit"""
+        # Popen.wait(timeout) sleep-polls; a pidfd becomes readable the
+        # moment the process exits (Linux 5.3+)
+        if hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(self.process.pid)
+            except OSError:
+                pidfd = None
+            
+            if pidfd is not None:
+                try:
+                    ready, _, _ = select.select([pidfd], [], [], timeout)
+                finally:
+                    os.close(pidfd)
+                
+                if not ready:
+                    raise subprocess.TimeoutExpired(self.process.args, timeout)
+        
+        self.process.wait(timeout=timeout)
+    
     def is_running(self):
         """Check if emulator is running"""
+        checked_at, running = self._running_cache
+        if time.monotonic() - checked_at < 0.5:
+            return running
+        
         try:
             result = subprocess.run(
                 ["adb", "devices"],
@@ -90,7 +121,9 @@ class EmulatorManager:
             )
             
             device_id = f"emulator-{self.port}"
-            return device_id in result.stdout
+            running = device_id in result.stdout
+            self._running_cache = (time.monotonic(), running)
+            return running
             
         except Exception as e:
             logger.error(f"Failed to check emulator status: {str(e)}")
@@ -99,29 +132,36 @@ class EmulatorManager:
     def _wait_for_boot(self):
         """Wait for emulator to fully boot"""
         device_id = f"emulator-{self.port}"
-        start_time = time.time()
         
-        while time.time() - start_time < self.wait_timeout:
-            try:
-                # Check if device is online
-                result = subprocess.run(
-                    ["adb", "-s", device_id, "shell", "getprop", "sys.boot_completed"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                if "1" in result.stdout.strip():
-                    # Wait additional time for system to stabilize
-                    time.sleep(10)
-                    return True
-                    
-            except Exception:
-                pass
-            
-            time.sleep(2)
+        def booted():
+            # sys.boot_completed flips before the boot animation finishes;
+            # waiting for bootanim to stop replaces a fixed stabilization delay
+            boot_completed, bootanim = self._getprops(
+                device_id, "sys.boot_completed", "init.svc.bootanim"
+            )
+            return boot_completed == "1" and bootanim == "stopped"
+        
+        return wait_until(booted, self.wait_timeout, 0.25)
+    
+    def _getprops(self, device_id, *props):
+        """Read system properties in one adb round-trip ('' until the device is up)"""
+        # One echo per property keeps a line per value even when it's unset
+        script = "; ".join(f'echo "$(getprop {prop})"' for prop in props)
+        
+        try:
+            result = subprocess.run(
+                ["adb", "-s", device_id, "shell", script],
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+            values = [line.strip() for line in result.stdout.splitlines()]
+            if result.returncode == 0 and len(values) == len(props):
+                return values
+        except Exception:
+            pass
         
-        return False
+        return [""] * len(props)
     
     def _get_emulator_path(self):
         """Get path to emulator executable"""
@@ -1,73 +1,22 @@
 """
 Report Generator - Creates HTML/PDF test reports
 """
+import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+from html import escape as _esc
 from pathlib import Path
 from datetime import datetime
 from loguru import logger
 
-class ReportGenerator:
-    def __init__(self, config):
-        self.config = config
-        self.output_dir = Path(config['report']['output_dir'])
-        self.output_dir.mkdir(exist_ok=True)
-    
-    def generate(self, test_summary, apk_info):
-        """Generate test report"""
-        logger.info("Generating test report...")
-        
-        report_format = self.config['report']['format']
-        
-        if report_format == 'html':
-            return self._generate_html(test_summary, apk_info)
-        elif report_format == 'json':
-            return self._generate_json(test_summary, apk_info)
-        elif report_format == 'pdf':
-            return self._generate_pdf(test_summary, apk_info)
-        else:
-            logger.error(f"Unknown report format: {report_format}")
-            return None
-    
-    def _generate_html(self, test_summary, apk_info):
-        """Generate HTML report"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"test_report_{timestamp}.html"
-        filepath = self.output_dir / filename
-        
-        html_content = self._create_html_content(test_summary, apk_info)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        logger.info(f"HTML report generated: {filepath}")
-        return str(filepath)
-    
-    def _generate_json(self, test_summary, apk_info):
-        """Generate JSON report"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"test_report_{timestamp}.json"
-        filepath = self.output_dir / filename
-        
-        report_data = {
-            'apk_info': apk_info,
-            'test_summary': test_summary,
-            'timestamp': timestamp
-        }
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(report_data, f, indent=2)
-        
-        logger.info(f"JSON report generated: {filepath}")
-        return str(filepath)
-    
-    def _create_html_content(self, test_summary, apk_info):
-        """Create HTML report content"""
-        total = test_summary['total_tests']
-        passed = test_summary['passed']
-        failed = test_summary['failed']
-        pass_rate = (passed / total * 100) if total > 0 else 0
-        
-        html = f"""
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used instead
+    orjson = None
+
+# Static document shell, built once at import; only the summary block and the
+# per-result items are formatted for each report
+_HTML_HEAD = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -75,210 +24,210 @@ class ReportGenerator:
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Mobile App Test Report</title>
     <style>
-        * {{
+        * {
             margin: 0;
             padding: 0;
             box-sizing: border-box;
-        }}
+        }
         
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             padding: 20px;
             color: #333;
-        }}
+        }
         
-        .container {{
+        .container {
             max-width: 1200px;
             margin: 0 auto;
             background: white;
             border-radius: 15px;
             box-shadow: 0 20px 60px rgba(0,0,0,0.3);
             overflow: hidden;
-        }}
+        }
         
-        .header {{
+        .header {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             padding: 40px;
             text-align: center;
-        }}
+        }
         
-        .header h1 {{
+        .header h1 {
             font-size: 2.5em;
             margin-bottom: 10px;
             text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-        }}
+        }
         
-        .header p {{
+        .header p {
             font-size: 1.1em;
             opacity: 0.9;
-        }}
+        }
         
-        .summary {{
+        .summary {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 20px;
             padding: 40px;
             background: #f8f9fa;
-        }}
+        }
         
-        .stat-card {{
+        .stat-card {
             background: white;
             padding: 25px;
             border-radius: 10px;
             text-align: center;
             box-shadow: 0 4px 6px rgba(0,0,0,0.1);
             transition: transform 0.3s;
-        }}
+        }
         
-        .stat-card:hover {{
+        .stat-card:hover {
             transform: translateY(-5px);
-        }}
+        }
         
-        .stat-number {{
+        .stat-number {
             font-size: 3em;
             font-weight: bold;
             margin: 10px 0;
-        }}
+        }
         
-        .stat-label {{
+        .stat-label {
             color: #666;
             font-size: 0.9em;
             text-transform: uppercase;
             letter-spacing: 1px;
-        }}
+        }
         
-        .passed {{ color: #28a745; }}
-        .failed {{ color: #dc3545; }}
-        .total {{ color: #007bff; }}
-        .screens {{ color: #17a2b8; }}
+        .passed { color: #28a745; }
+        .failed { color: #dc3545; }
+        .total { color: #007bff; }
+        .screens { color: #17a2b8; }
         
-        .content {{
+        .content {
             padding: 40px;
-        }}
+        }
         
-        .section {{
+        .section {
             margin-bottom: 40px;
-        }}
+        }
         
-        .section h2 {{
+        .section h2 {
             color: #667eea;
             font-size: 1.8em;
             margin-bottom: 20px;
             padding-bottom: 10px;
             border-bottom: 3px solid #667eea;
-        }}
+        }
         
-        .app-info {{
+        .app-info {
             background: #f8f9fa;
             padding: 20px;
             border-radius: 10px;
             margin-bottom: 20px;
-        }}
+        }
         
-        .app-info-item {{
+        .app-info-item {
             display: flex;
             padding: 10px 0;
             border-bottom: 1px solid #e0e0e0;
-        }}
+        }
         
-        .app-info-item:last-child {{
+        .app-info-item:last-child {
             border-bottom: none;
-        }}
+        }
         
-        .app-info-label {{
+        .app-info-label {
             font-weight: bold;
             width: 200px;
             color: #555;
-        }}
+        }
         
-        .app-info-value {{
+        .app-info-value {
             flex: 1;
             color: #333;
-        }}
+        }
         
-        .test-results {{
+        .test-results {
             display: grid;
             gap: 20px;
-        }}
+        }
         
-        .test-item {{
+        .test-item {
             background: white;
             border: 1px solid #e0e0e0;
             border-radius: 10px;
             padding: 20px;
             transition: all 0.3s;
-        }}
+        }
         
-        .test-item:hover {{
+        .test-item:hover {
             box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-        }}
+        }
         
-        .test-header {{
+        .test-header {
             display: flex;
             justify-content: space-between;
             align-items: center;
             margin-bottom: 15px;
-        }}
+        }
         
-        .test-name {{
+        .test-name {
             font-size: 1.2em;
             font-weight: 600;
             color: #333;
-        }}
+        }
         
-        .test-status {{
+        .test-status {
             padding: 5px 15px;
             border-radius: 20px;
             font-weight: bold;
             font-size: 0.9em;
-        }}
+        }
         
-        .status-pass {{
+        .status-pass {
             background: #d4edda;
             color: #155724;
-        }}
+        }
         
-        .status-fail {{
+        .status-fail {
             background: #f8d7da;
             color: #721c24;
-        }}
+        }
         
-        .test-details {{
+        .test-details {
             background: #f8f9fa;
             padding: 15px;
             border-radius: 5px;
             margin-top: 10px;
             font-size: 0.9em;
-        }}
+        }
         
-        .screenshot {{
+        .screenshot {
             margin-top: 15px;
-        }}
+        }
         
-        .screenshot img {{
+        .screenshot img {
             max-width: 100%;
             border-radius: 10px;
             box-shadow: 0 4px 8px rgba(0,0,0,0.2);
             cursor: pointer;
             transition: transform 0.3s;
-        }}
+        }
         
-        .screenshot img:hover {{
+        .screenshot img:hover {
             transform: scale(1.02);
-        }}
+        }
         
-        .progress-bar {{
+        .progress-bar {
             width: 100%;
             height: 30px;
             background: #e0e0e0;
             border-radius: 15px;
             overflow: hidden;
             margin: 20px 0;
-        }}
+        }
         
-        .progress-fill {{
+        .progress-fill {
             height: 100%;
             background: linear-gradient(90deg, #28a745, #20c997);
             display: flex;
@@ -287,31 +236,33 @@ class ReportGenerator:
             color: white;
             font-weight: bold;
             transition: width 1s;
-        }}
+        }
         
-        .footer {{
+        .footer {
             background: #f8f9fa;
             padding: 20px;
             text-align: center;
             color: #666;
-        }}
+        }
         
-        @media (max-width: 768px) {{
-            .summary {{
+        @media (max-width: 768px) {
+            .summary {
                 grid-template-columns: 1fr;
-            }}
+            }
             
-            .header h1 {{
+            .header h1 {
                 font-size: 1.8em;
-            }}
-        }}
-    </style>
+            }
+        }
+"""
+
+_HTML_SUMMARY_TMPL = """    </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
             <h1>📱 Mobile App Test Report</h1>
-            <p>Automated Testing Results - {datetime.now().strftime("%B %d, %Y at %I:%M %p")}</p>
+            <p>Automated Testing Results - {generated_at}</p>
         </div>
         
         <div class="summary">
@@ -329,7 +280,7 @@ class ReportGenerator:
             </div>
             <div class="stat-card">
                 <div class="stat-label">Screens Explored</div>
-                <div class="stat-number screens">{test_summary['screens_explored']}</div>
+                <div class="stat-number screens">{screens}</div>
             </div>
         </div>
         
@@ -348,15 +299,15 @@ class ReportGenerator:
                 <div class="app-info">
                     <div class="app-info-item">
                         <div class="app-info-label">Package Name:</div>
-                        <div class="app-info-value">{apk_info.get('package_name', 'N/A')}</div>
+                        <div class="app-info-value">{package_name}</div>
                     </div>
                     <div class="app-info-item">
                         <div class="app-info-label">Main Activity:</div>
-                        <div class="app-info-value">{apk_info.get('main_activity', 'N/A')}</div>
+                        <div class="app-info-value">{main_activity}</div>
                     </div>
                     <div class="app-info-item">
                         <div class="app-info-label">Total Screens:</div>
-                        <div class="app-info-value">{test_summary['screens_explored']}</div>
+                        <div class="app-info-value">{screens}</div>
                     </div>
                 </div>
             </div>
@@ -365,43 +316,34 @@ class ReportGenerator:
                 <h2>🧪 Test Results</h2>
                 <div class="test-results">
 """
-        
-        # Add test results
-        for result in test_summary['test_results']:
-            status_class = 'status-pass' if result['status'] == 'PASS' else 'status-fail'
-            details_html = ""
-            
-            if result.get('details'):
-                details = result['details']
-                details_html = f"""
+
+_HTML_DETAILS_TMPL = """
                 <div class="test-details">
-                    <strong>Element Type:</strong> {details.get('type', 'N/A')}<br>
-                    <strong>Text:</strong> {details.get('text', 'N/A')}<br>
-                    <strong>Resource ID:</strong> {details.get('resource_id', 'N/A')}<br>
-                    <strong>Content Description:</strong> {details.get('content_desc', 'N/A')}
+                    <strong>Element Type:</strong> {type}<br>
+                    <strong>Text:</strong> {text}<br>
+                    <strong>Resource ID:</strong> {resource_id}<br>
+                    <strong>Content Description:</strong> {content_desc}
                 </div>
 """
-            
-            screenshot_html = ""
-            if result.get('screenshot'):
-                screenshot_html = f"""
+
+_HTML_SCREENSHOT_TMPL = """
                 <div class="screenshot">
-                    <img src="../{result['screenshot']}" alt="Screenshot" loading="lazy">
+                    <a href="../{screenshot}"><img src="../{thumbnail}" alt="Screenshot" loading="lazy"></a>
                 </div>
 """
-            
-            html += f"""
+
+_HTML_ITEM_TMPL = """
                     <div class="test-item">
                         <div class="test-header">
-                            <div class="test-name">{result['test_name']}</div>
-                            <div class="test-status {status_class}">{result['status']}</div>
+                            <div class="test-name">{test_name}</div>
+                            <div class="test-status {status_class}">{status}</div>
                         </div>
                         {details_html}
                         {screenshot_html}
                     </div>
 """
-        
-        html += """
+
+_HTML_FOOTER = """
                 </div>
             </div>
         </div>
@@ -414,23 +356,189 @@ class ReportGenerator:
 </body>
 </html>
 """
+
+# The report is written as bytes; the static chunks are encoded once here and
+# only the formatted per-report chunks are encoded as they are produced
+_UTF8 = 'utf-8'
+_HTML_HEAD_B = _HTML_HEAD.encode(_UTF8)
+_HTML_FOOTER_B = _HTML_FOOTER.encode(_UTF8)
+
+# WeasyPrint font configuration, created on first PDF and reused afterwards
+_font_config = None
+
+class ReportGenerator:
+    def __init__(self, config):
+        self.config = config
+        self.output_dir = Path(config['report']['output_dir'])
+        self.output_dir.mkdir(exist_ok=True)
+    
+    def generate(self, test_summary, apk_info):
+        """Generate test report"""
+        logger.info("Generating test report...")
+        
+        report_format = self.config['report']['format']
+        now = datetime.now()
         
-        return html
+        if report_format == 'html':
+            return self._generate_html(test_summary, apk_info, now)
+        elif report_format == 'json':
+            return self._generate_json(test_summary, apk_info, now)
+        elif report_format == 'pdf':
+            html_content = b"".join(self._create_html_content(test_summary, apk_info, now))
+            return self._generate_pdf(html_content, now)
+        else:
+            logger.error(f"Unknown report format: {report_format}")
+            return None
     
-    def _generate_pdf(self, test_summary, apk_info):
-        """Generate PDF report (requires HTML first)"""
+    def _generate_html(self, test_summary, apk_info, now):
+        """Generate HTML report"""
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        filename = f"test_report_{timestamp}.html"
+        filepath = self.output_dir / filename
+        
+        # Stream the report out item by item instead of building it in memory
+        with open(filepath, 'wb', buffering=1 << 20) as f:
+            f.writelines(self._create_html_content(test_summary, apk_info, now))
+        
+        logger.info(f"HTML report generated: {filepath}")
+        return str(filepath)
+    
+    def _generate_json(self, test_summary, apk_info, now):
+        """Generate JSON report"""
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        filename = f"test_report_{timestamp}.json"
+        filepath = self.output_dir / filename
+        
+        report_data = {
+            'apk_info': apk_info,
+            'test_summary': test_summary,
+            'timestamp': timestamp
+        }
+        
+        pretty = self.config['report'].get('pretty', False)
+        
+        if orjson is not None:
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps(report_data, option=orjson.OPT_INDENT_2 if pretty else 0))
+        else:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                if pretty:
+                    json.dump(report_data, f, indent=2)
+                else:
+                    json.dump(report_data, f, separators=(',', ':'))
+        
+        logger.info(f"JSON report generated: {filepath}")
+        return str(filepath)
+    
+    def _create_html_content(self, test_summary, apk_info, now):
+        """Yield UTF-8 encoded HTML report content chunk by chunk"""
+        total = test_summary['total_tests']
+        passed = test_summary['passed']
+        failed = test_summary['failed']
+        pass_rate = (passed / total * 100) if total > 0 else 0
+        esc = _esc  # local alias for the per-field calls below
+        thumbnails = self._create_thumbnails(test_summary['test_results'])
+        
+        yield _HTML_HEAD_B
+        yield _HTML_SUMMARY_TMPL.format(
+            generated_at=now.strftime("%B %d, %Y at %I:%M %p"),
+            total=total,
+            passed=passed,
+            failed=failed,
+            screens=test_summary['screens_explored'],
+            pass_rate=pass_rate,
+            package_name=esc(str(apk_info.get('package_name', 'N/A'))),
+            main_activity=esc(str(apk_info.get('main_activity', 'N/A')))
+        ).encode(_UTF8)
+        
+        # Add test results, projected to just the fields the templates use
+        projected = (
+            (r['test_name'], r['status'], r.get('details'), r.get('screenshot'))
+            for r in test_summary['test_results']
+        )
+        
+        for test_name, status, details, screenshot in projected:
+            status_class = 'status-pass' if status == 'PASS' else 'status-fail'
+            details_html = ""
+            
+            if details:
+                details_html = _HTML_DETAILS_TMPL.format(
+                    type=esc(str(details.get('type', 'N/A'))),
+                    text=esc(str(details.get('text', 'N/A'))),
+                    resource_id=esc(str(details.get('resource_id', 'N/A'))),
+                    content_desc=esc(str(details.get('content_desc', 'N/A')))
+                )
+            
+            screenshot_html = ""
+            if screenshot:
+                screenshot_html = _HTML_SCREENSHOT_TMPL.format(
+                    screenshot=esc(str(screenshot)),
+                    thumbnail=esc(str(thumbnails.get(screenshot) or screenshot))
+                )
+            
+            yield _HTML_ITEM_TMPL.format(
+                test_name=esc(str(test_name)),
+                status_class=status_class,
+                status=esc(str(status)),
+                details_html=details_html,
+                screenshot_html=screenshot_html
+            ).encode(_UTF8)
+        
+        yield _HTML_FOOTER_B
+    
+    def _create_thumbnails(self, test_results):
+        """Build report thumbnails for all screenshots in parallel"""
+        screenshots = {r['screenshot'] for r in test_results if r.get('screenshot')}
+        if not screenshots:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            return dict(zip(screenshots, executor.map(self._thumbnail, screenshots)))
+    
+    def _thumbnail(self, src, max_w=240):
+        """Create a small JPEG preview of a screenshot, or None if it can't be read"""
+        try:
+            from PIL import Image
+            
+            src_path = Path(src)
+            thumb_path = src_path.parent / "thumbs" / f"{src_path.stem}.jpg"
+            
+            # Screenshots are never rewritten, so an existing thumbnail is current
+            if not thumb_path.exists():
+                thumb_path.parent.mkdir(exist_ok=True)
+                with Image.open(src_path) as image:
+                    image.thumbnail((max_w, max_w * 4))
+                    image.convert("RGB").save(thumb_path, "JPEG", optimize=True, quality=80)
+            
+            return thumb_path.as_posix()
+            
+        except ImportError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to create thumbnail for {src}: {str(e)}")
+            return None
+    
+    def _generate_pdf(self, html_content, now):
+        """Generate PDF report from already-rendered HTML bytes"""
+        global _font_config
+        
         try:
             from weasyprint import HTML
+            from weasyprint.text.fonts import FontConfiguration
             
-            # First generate HTML
-            html_content = self._create_html_content(test_summary, apk_info)
+            if _font_config is None:
+                _font_config = FontConfiguration()
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
             filename = f"test_report_{timestamp}.pdf"
             filepath = self.output_dir / filename
             
-            # Convert to PDF
-            HTML(string=html_content).write_pdf(filepath)
+            # Convert to PDF; screenshots are referenced relative to the report dir
+            base_url = self.output_dir.resolve().as_uri() + "/"
+            HTML(string=html_content.decode(_UTF8), base_url=base_url).write_pdf(
+                filepath,
+                font_config=_font_config
+            )
             
             logger.info(f"PDF report generated: {filepath}")
             return str(filepath)
@@ -3,9 +3,16 @@ Test Executor - Main testing logic with exploration strategies
 """
 import time
 import random
+import re
 from collections import deque
 from loguru import logger
 
+# Text that marks an element as worth trying first (login, submit, etc.)
+_PRIORITY_RE = re.compile(r'login|sign|submit|next|continue|ok|yes', re.IGNORECASE)
+
+# Lookup keys UIExplorer derives for each element; kept out of the report
+_DERIVED_KEYS = frozenset({'signature', 'type_lower', 'resource_id_lower', 'text_lower'})
+
 class TestExecutor:
     def __init__(self, config, ui_explorer, apk_installer):
         self.config = config
@@ -14,8 +21,17 @@ class TestExecutor:
         self.test_results = []
         self.exploration_queue = deque()
         self.action_history = []
+        self._clicked_signatures = set()  # signatures of elements already acted on
         self.max_depth = config['testing']['max_exploration_depth']
         self.max_clicks = config['testing']['max_clicks_per_screen']
+        self.exploration_timeout = config['testing'].get('exploration_timeout', 1800)
+        
+        # Element selection for the configured strategy; anything else is hybrid
+        self._select = {
+            'random': random.choice,
+            'bfs': lambda elements: elements[0],  # First element
+            'dfs': lambda elements: elements[-1],  # Last element
+        }.get(config['exploration']['strategy'], self._smart_select_element)
     
     def run_tests(self, documentation=None):
         """Run all tests"""
@@ -45,84 +61,61 @@ class TestExecutor:
         return self._generate_results_summary()
     
     def _explore_app(self):
-        """Explore app using hybrid strategy"""
-        strategy = self.config['exploration']['strategy']
-        
+        """Explore app breadth-first from a frontier of unclicked elements"""
         # Reset and launch app
-        self.apk.stop()
-        self.apk.launch()
-        time.sleep(3)
+        root = self._relaunch()
         
         # Take initial screenshot
         screenshot = self.ui.take_screenshot("initial_screen")
         self._record_action("Launch App", True, screenshot)
         
-        visited_depth = 0
-        clicks_on_screen = 0
-        stuck_count = 0
+        start_hash = self.ui.get_screen_hash(root)
+        self.ui.is_new_screen(root)
+        self.ui.screen_graph[start_hash] = {'parent': None, 'element': None, 'depth': 0}
+        self._enqueue_screen(start_hash)
         
-        while visited_depth < self.max_depth:
-            # Get current screen elements
-            elements = self.ui.extract_elements()
-            
-            if not elements:
-                logger.warning("No interactive elements found")
+        # The frontier can grow by max_clicks per screen, so bound the whole run
+        deadline = time.monotonic() + self.exploration_timeout
+        
+        while self.exploration_queue:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Exploration timeout reached, "
+                               f"{len(self.exploration_queue)} elements left unexplored")
                 break
             
-            # Filter already clicked elements on this screen
-            new_elements = [e for e in elements if self._is_new_element(e)]
+            screen_hash, target = self.exploration_queue.popleft()
+            if not self._is_new_element(target):
+                continue
             
-            if not new_elements or clicks_on_screen >= self.max_clicks:
-                # Try scrolling to reveal more elements
-                if clicks_on_screen < self.max_clicks:
-                    self.ui.scroll_down()
-                    elements = self.ui.extract_elements()
-                    new_elements = [e for e in elements if self._is_new_element(e)]
-                
-                # If still no new elements, go back
-                if not new_elements:
-                    logger.info("No more elements to explore, going back...")
-                    self.ui.press_back()
-                    time.sleep(1)
-                    
-                    # Check if we're stuck
-                    current_hash = self.ui.get_screen_hash()
-                    if current_hash in self.ui.visited_screens:
-                        stuck_count += 1
-                        if stuck_count > 3:
-                            logger.warning("Stuck in loop, restarting app...")
-                            self.apk.stop()
-                            self.apk.launch()
-                            time.sleep(3)
-                            stuck_count = 0
-                            visited_depth = 0
-                    
-                    clicks_on_screen = 0
-                    continue
+            if not self._navigate_to(screen_hash):
+                logger.warning("Could not return to screen, skipping its element")
+                continue
             
-            # Select element based on strategy
-            if strategy == "random":
-                element = random.choice(new_elements)
-            elif strategy == "bfs":
-                element = new_elements[0]  # First element
-            elif strategy == "dfs":
-                element = new_elements[-1]  # Last element
-            else:  # hybrid
-                element = self._smart_select_element(new_elements)
+            # Find the element on the live screen; it may be below the fold
+            element = self._find_element(target['signature'])
+            if element is None and self.ui.scrollables:
+                self.ui.scroll_down()
+                self.ui.wait_until_settled()
+                element = self._find_element(target['signature'])
+            if element is None:
+                logger.debug(f"Element no longer on screen: {target['signature']}")
+                continue
             
             # Perform action
             element_desc = element['text'] or element['content_desc'] or element['type']
             logger.info(f"Clicking: {element_desc}")
             
-            # Take screenshot before action
-            screenshot_before = self.ui.take_screenshot(f"before_{element_desc[:20]}")
-            
             # Click element
             success = self.ui.tap_element(element)
-            time.sleep(2)
+            root = self.ui.wait_until_settled()
+            
+            # Check if new screen, reusing the dump taken while settling
+            new_screen = self.ui.is_new_screen(root)
             
-            # Take screenshot after action
-            screenshot_after = self.ui.take_screenshot(f"after_{element_desc[:20]}")
+            # Only failures and newly reached screens are worth a screenshot
+            screenshot_after = None
+            if not success or new_screen:
+                screenshot_after = self.ui.take_screenshot(f"after_{element_desc[:20]}")
             
             # Record action
             self._record_action(
@@ -132,24 +125,89 @@ class TestExecutor:
                 element
             )
             
-            # Check if new screen
-            if self.ui.is_new_screen():
+            if new_screen:
                 logger.info("New screen discovered!")
-                visited_depth += 1
-                clicks_on_screen = 0
-                stuck_count = 0
-            else:
-                clicks_on_screen += 1
-            
-            # Small delay between actions
-            time.sleep(1)
+                new_hash = self.ui.current_screen_hash
+                self.ui.screen_graph[new_hash] = {
+                    'parent': screen_hash,
+                    'element': element,
+                    'depth': self.ui.screen_graph[screen_hash]['depth'] + 1
+                }
+                self._enqueue_screen(new_hash)
+    
+    def _enqueue_screen(self, screen_hash):
+        """Add a newly discovered screen's unclicked elements to the frontier"""
+        if self.ui.screen_graph[screen_hash]['depth'] >= self.max_depth:
+            return
+        
+        remaining = [e for e in self.ui.extract_elements() if self._is_new_element(e)]
+        
+        # Try scrolling to reveal more elements
+        if not remaining and self.ui.scrollables:
+            self.ui.scroll_down()
+            remaining = [e for e in self.ui.extract_elements(self.ui.wait_until_settled())
+                         if self._is_new_element(e)]
+        
+        # Queue up to max_clicks elements in the order the strategy would pick them
+        for _ in range(min(self.max_clicks, len(remaining))):
+            element = self._select(remaining)
+            remaining.remove(element)
+            self.exploration_queue.append((screen_hash, element))
+    
+    def _find_element(self, signature):
+        """Return the element with this signature on the current screen, if any"""
+        for element in self.ui.extract_elements():
+            if element['signature'] == signature:
+                return element
+        return None
+    
+    def _relaunch(self):
+        """Restart the app from scratch; returns the settled root"""
+        self.apk.stop()
+        self.apk.launch()
+        self.ui.invalidate_cache()
+        return self.ui.wait_until_settled()
+    
+    def _navigate_to(self, screen_hash):
+        """Reach a known screen by pressing back or by replaying taps from launch"""
+        graph = self.ui.screen_graph
+        current = self.ui.get_screen_hash()
+        
+        # Target is an ancestor of the current screen: walk back up to it
+        presses = 0
+        node = current
+        while node in graph and node != screen_hash:
+            node = graph[node]['parent']
+            presses += 1
+        
+        if node == screen_hash:
+            for _ in range(presses):
+                self.ui.press_back()
+                current = self.ui.get_screen_hash(self.ui.wait_until_settled())
+            if current == screen_hash:
+                return True
+        
+        # Otherwise restart and repeat the taps that first reached the target
+        path = []
+        node = screen_hash
+        while graph[node]['parent'] is not None:
+            path.append(graph[node]['element'])
+            node = graph[node]['parent']
+        
+        current = self.ui.get_screen_hash(self._relaunch())
+        for element in reversed(path):
+            self.ui.tap_element(element)
+            current = self.ui.get_screen_hash(self.ui.wait_until_settled())
+        
+        return current == screen_hash
     
     def _test_common_flows(self):
         """Test common app flows"""
         # Restart app
         self.apk.stop()
         self.apk.launch()
-        time.sleep(3)
+        self.ui.invalidate_cache()
+        self.ui.wait_until_settled()
         
         # Test navigation patterns
         self._test_navigation()
@@ -169,15 +227,15 @@ class TestExecutor:
             
             # Find navigation elements (tabs, menu items, etc.)
             nav_elements = [e for e in elements if 
-                          'tab' in e['type'].lower() or
-                          'menu' in e['type'].lower() or
-                          'navigation' in e['resource_id'].lower()]
+                          'tab' in e['type_lower'] or
+                          'menu' in e['type_lower'] or
+                          'navigation' in e['resource_id_lower']]
             
             if nav_elements:
                 element = random.choice(nav_elements)
                 screenshot = self.ui.take_screenshot(f"nav_test_{i}")
                 self.ui.tap_element(element)
-                time.sleep(2)
+                self.ui.wait_until_settled()
                 
                 self._record_action(
                     f"Navigation Test {i+1}",
@@ -196,13 +254,13 @@ class TestExecutor:
             if elements:
                 element = random.choice(elements)
                 self.ui.tap_element(element)
-                time.sleep(1)
+                self.ui.wait_until_settled()
         
         # Press back multiple times
         for i in range(3):
             screenshot = self.ui.take_screenshot(f"back_test_{i}")
             self.ui.press_back()
-            time.sleep(1)
+            self.ui.wait_until_settled()
             
             self._record_action(
                 f"Back Button Test {i+1}",
@@ -217,14 +275,15 @@ class TestExecutor:
         # Restart app
         self.apk.stop()
         self.apk.launch()
-        time.sleep(3)
+        self.ui.invalidate_cache()
+        self.ui.wait_until_settled()
         
         # Look for input fields
         elements = self.ui.extract_elements()
         input_fields = [e for e in elements if 
                        'EditText' in e['type'] or
-                       'edit' in e['resource_id'].lower() or
-                       'input' in e['resource_id'].lower()]
+                       'edit' in e['resource_id_lower'] or
+                       'input' in e['resource_id_lower']]
         
         test_data = {
             'email': 'test@example.com',
@@ -237,8 +296,8 @@ class TestExecutor:
         
         for field in input_fields:
             # Determine field type from hints
-            field_id = field['resource_id'].lower()
-            field_text = field['text'].lower()
+            field_id = field['resource_id_lower']
+            field_text = field['text_lower']
             
             test_value = test_data['default']
             if 'email' in field_id or 'email' in field_text:
@@ -262,7 +321,7 @@ class TestExecutor:
                 field
             )
             
-            time.sleep(1)
+            self.ui.wait_until_settled()
     
     def _smart_select_element(self, elements):
         """Smart element selection based on priority"""
@@ -271,22 +330,19 @@ class TestExecutor:
         # 2. Navigation elements
         # 3. Other clickable elements
         
-        important_keywords = ['login', 'sign', 'submit', 'next', 'continue', 'ok', 'yes']
-        
         # Find high priority elements
-        high_priority = []
-        for elem in elements:
-            text = (elem['text'] + elem['content_desc']).lower()
-            if any(keyword in text for keyword in important_keywords):
-                high_priority.append(elem)
+        high_priority = [
+            elem for elem in elements
+            if _PRIORITY_RE.search(elem['text'] + elem['content_desc'])
+        ]
         
         if high_priority:
             return random.choice(high_priority)
         
         # Find navigation elements
         nav_elements = [e for e in elements if 
-                       'tab' in e['type'].lower() or
-                       'menu' in e['type'].lower()]
+                       'tab' in e['type_lower'] or
+                       'menu' in e['type_lower']]
         
         if nav_elements:
             return random.choice(nav_elements)
@@ -296,28 +352,28 @@ class TestExecutor:
     
     def _is_new_element(self, element):
         """Check if element hasn't been clicked yet"""
-        element_signature = f"{element['resource_id']}_{element['text']}_{element['bounds']}"
-        
-        for action in self.action_history:
-            if action.get('element'):
-                prev_signature = f"{action['element'].get('resource_id', '')}_{action['element'].get('text', '')}_{action['element'].get('bounds', '')}"
-                if element_signature == prev_signature:
-                    return False
-        
-        return True
+        return element['signature'] not in self._clicked_signatures
     
     def _record_action(self, action_name, success, screenshot=None, element=None):
         """Record an action in history"""
+        if element:
+            element_record = {k: v for k, v in element.items() if k not in _DERIVED_KEYS}
+        else:
+            element_record = element
+        
         action_record = {
             'action': action_name,
             'success': success,
             'screenshot': screenshot,
-            'element': element,
+            'element': element_record,
             'timestamp': time.time()
         }
         
         self.action_history.append(action_record)
         
+        if element:
+            self._clicked_signatures.add(element['signature'])
+        
         # Also add to test results
         self.test_results.append({
             'test_name': action_name,
@@ -340,6 +396,9 @@ class TestExecutor:
     
     def _generate_results_summary(self):
         """Generate summary of test results"""
+        # Screenshots are written in the background; the report needs them on disk
+        self.ui.flush_screenshots()
+        
         total_tests = len(self.test_results)
         passed = sum(1 for r in self.test_results if r['status'] == 'PASS')
         failed = total_tests - passed
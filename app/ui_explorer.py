@@ -2,12 +2,39 @@
 UI Explorer - Explores app UI and extracts element hierarchy
 """
 import subprocess
-import xml.etree.ElementTree as ET
 import time
 import hashlib
+import itertools
+import queue
+import re
+import shlex
+import threading
 from pathlib import Path
 from loguru import logger
 
+from .utils import AdbShell
+
+try:
+    from lxml import etree as ET
+    _XML_PARSER = ET.XMLParser(huge_tree=True, recover=True)
+except ImportError:  # optional; stdlib ElementTree is used instead
+    import xml.etree.ElementTree as ET
+    _XML_PARSER = None
+
+try:
+    import xxhash
+except ImportError:  # optional; blake2b is used instead
+    xxhash = None
+
+# uiautomator bounds: [x1,y1][x2,y2]
+_BOUNDS_RE = re.compile(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]')
+
+def _digest(signature):
+    """64-bit hex fingerprint of a signature string"""
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(signature)
+    return hashlib.blake2b(signature.encode(), digest_size=8).hexdigest()
+
 class UIExplorer:
     def __init__(self, config):
         self.config = config
@@ -17,30 +44,64 @@ class UIExplorer:
         self.visited_screens = set()
         self.screen_graph = {}
         self.current_screen_hash = None
+        self.settle_timeout = config['testing'].get('settle_timeout_ms', 1500) / 1000
+        self._sdk_level = None  # device API level, read on first use
+        
+        # Last dumped hierarchy and its hash; reused until an action changes the screen
+        self._cached_root = None
+        self._cached_hash = None
+        
+        # (x1, y1, x2, y2) of scroll containers seen by the last extract_elements()
+        self.scrollables = []
+        
+        # Input commands go through one long-lived shell instead of an adb fork each
+        self.shell = AdbShell(("adb", "-s", self.device_id))
+        
+        # Screenshots are captured on the device immediately and copied to the
+        # host by a background worker, so the PNG transfer never blocks exploration
+        self._screenshot_queue = queue.Queue()
+        self._screenshot_seq = itertools.count()
+        threading.Thread(target=self._screenshot_worker, daemon=True).start()
+    
+    def _send(self, cmd, timeout=5):
+        """Run an input command in the persistent shell"""
+        return self.shell.run(cmd, timeout=timeout)
+    
+    def _api_level(self):
+        """Device API level from ro.build.version.sdk, cached; 0 if unknown"""
+        if self._sdk_level is None:
+            try:
+                self._sdk_level = int(self._send("getprop ro.build.version.sdk").stdout.strip())
+            except Exception as e:
+                logger.debug(f"Could not read API level: {str(e)}")
+                self._sdk_level = 0
+        return self._sdk_level
+    
+    def close(self):
+        """Finish pending screenshots and close the persistent shell session"""
+        self.flush_screenshots()
+        self.shell.close()
     
     def get_ui_hierarchy(self):
         """Get current screen's UI hierarchy"""
         try:
-            # Dump UI hierarchy
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "uiautomator", "dump", 
-                 "/sdcard/window_dump.xml"],
+            # Stream the dump straight back instead of writing and pulling a file
+            result = subprocess.run(
+                ["adb", "-s", self.device_id, "exec-out", "uiautomator", "dump", "/dev/tty"],
                 capture_output=True,
                 timeout=10
             )
             
-            # Pull the file
-            subprocess.run(
-                ["adb", "-s", self.device_id, "pull", "/sdcard/window_dump.xml", 
-                 "temp_hierarchy.xml"],
-                capture_output=True,
-                timeout=10
-            )
+            # uiautomator appends a status line after the XML
+            output = result.stdout
+            end = output.rfind(b"</hierarchy>")
+            if end == -1:
+                raise ValueError("No UI hierarchy in uiautomator output")
             
-            # Parse XML
-            tree = ET.parse("temp_hierarchy.xml")
-            root = tree.getroot()
+            root = ET.fromstring(output[output.find(b"<"):end + len(b"</hierarchy>")], _XML_PARSER)
             
+            self._cached_root = root
+            self._cached_hash = None
             return root
             
         except Exception as e:
@@ -49,6 +110,8 @@ class UIExplorer:
     
     def extract_elements(self, root=None):
         """Extract interactive elements from UI hierarchy"""
+        if root is None:
+            root = self._cached_root
         if root is None:
             root = self.get_ui_hierarchy()
         
@@ -56,115 +119,188 @@ class UIExplorer:
             return []
         
         elements = []
+        scrollables = []
         
-        def traverse(node):
+        for node in root.iter('node'):
+            attrs = node.attrib
+            
             # Check if element is clickable or has text
-            clickable = node.get('clickable', 'false') == 'true'
-            checkable = node.get('checkable', 'false') == 'true'
-            long_clickable = node.get('long-clickable', 'false') == 'true'
-            scrollable = node.get('scrollable', 'false') == 'true'
-            text = node.get('text', '')
-            content_desc = node.get('content-desc', '')
-            resource_id = node.get('resource-id', '')
-            class_name = node.get('class', '')
-            bounds = node.get('bounds', '')
+            clickable = attrs.get('clickable') == 'true'
+            checkable = attrs.get('checkable') == 'true'
+            long_clickable = attrs.get('long-clickable') == 'true'
+            scrollable = attrs.get('scrollable') == 'true'
+            
+            if not (clickable or checkable or long_clickable or scrollable):
+                continue
+            
+            # A scroll container that cannot be tapped is a scroll target,
+            # not an exploration candidate
+            if not (clickable or checkable or long_clickable):
+                match = _BOUNDS_RE.match(attrs.get('bounds', ''))
+                if match:
+                    scrollables.append(tuple(map(int, match.groups())))
+                continue
             
             # Parse bounds [x1,y1][x2,y2]
+            bounds = attrs.get('bounds', '')
             center = self._parse_bounds(bounds)
+            if not center:
+                continue
             
-            if (clickable or checkable or long_clickable or scrollable) and center:
-                element = {
-                    'type': class_name.split('.')[-1],
-                    'text': text,
-                    'content_desc': content_desc,
-                    'resource_id': resource_id,
-                    'clickable': clickable,
-                    'checkable': checkable,
-                    'long_clickable': long_clickable,
-                    'scrollable': scrollable,
-                    'bounds': bounds,
-                    'center': center,
-                    'class': class_name
-                }
-                elements.append(element)
-            
-            # Traverse children
-            for child in node:
-                traverse(child)
+            class_name = attrs.get('class', '')
+            element_type = class_name.rpartition('.')[2]
+            text = attrs.get('text', '')
+            resource_id = attrs.get('resource-id', '')
+            elements.append({
+                'type': element_type,
+                'text': text,
+                'content_desc': attrs.get('content-desc', ''),
+                'resource_id': resource_id,
+                'clickable': clickable,
+                'checkable': checkable,
+                'long_clickable': long_clickable,
+                'scrollable': scrollable,
+                'bounds': bounds,
+                'center': center,
+                'class': class_name,
+                # Identity used to tell whether the element was already acted on
+                'signature': f"{resource_id}_{text}_{bounds}",
+                # Lowercased once here for the executor's keyword filters
+                'type_lower': element_type.lower(),
+                'resource_id_lower': resource_id.lower(),
+                'text_lower': text.lower()
+            })
         
-        traverse(root)
+        self.scrollables = scrollables
         return elements
     
     def _parse_bounds(self, bounds_str):
         """Parse bounds string to get center coordinates"""
-        try:
-            # Format: [x1,y1][x2,y2]
-            import re
-            matches = re.findall(r'\[(\d+),(\d+)\]', bounds_str)
-            if len(matches) == 2:
-                x1, y1 = int(matches[0][0]), int(matches[0][1])
-                x2, y2 = int(matches[1][0]), int(matches[1][1])
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                return (center_x, center_y)
-        except Exception:
-            pass
+        # Format: [x1,y1][x2,y2]
+        match = _BOUNDS_RE.match(bounds_str)
+        if match:
+            x1, y1, x2, y2 = map(int, match.groups())
+            return ((x1 + x2) // 2, (y1 + y2) // 2)
         return None
     
     def take_screenshot(self, name="screen"):
-        """Take screenshot of current screen"""
+        """Take screenshot of current screen; the file is written in the background"""
         try:
             timestamp = int(time.time())
             filename = f"{name}_{timestamp}.png"
             filepath = self.screenshot_dir / filename
             
-            # Take screenshot
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "screencap", 
-                 "/sdcard/screenshot.png"],
-                capture_output=True,
-                timeout=10
-            )
+            # Capture now so the image matches this moment; only the copy is deferred
+            remote = f"/data/local/tmp/screen_{next(self._screenshot_seq)}.png"
+            result = self._send(f"screencap -p {remote}", timeout=10)
+            if result.returncode != 0:
+                raise RuntimeError(f"screencap failed: {result.stdout.strip()}")
             
-            # Pull screenshot
-            subprocess.run(
-                ["adb", "-s", self.device_id, "pull", "/sdcard/screenshot.png", 
-                 str(filepath)],
-                capture_output=True,
-                timeout=10
-            )
-            
-            logger.info(f"Screenshot saved: {filename}")
+            self._screenshot_queue.put((remote, filepath))
             return str(filepath)
             
         except Exception as e:
             logger.error(f"Failed to take screenshot: {str(e)}")
             return None
     
-    def get_screen_hash(self):
-        """Get hash of current screen for duplicate detection"""
+    def _screenshot_worker(self):
+        """Copy captured screenshots from the device to their host paths"""
+        while True:
+            remote, filepath = self._screenshot_queue.get()
+            try:
+                result = subprocess.run(
+                    ["adb", "-s", self.device_id, "exec-out", f"cat {remote} && rm {remote}"],
+                    capture_output=True,
+                    timeout=30
+                )
+                
+                if result.returncode != 0 or not result.stdout:
+                    raise RuntimeError(f"copy failed: {result.stderr.decode(errors='ignore').strip()}")
+                
+                with open(filepath, 'wb') as f:
+                    f.write(result.stdout)
+                
+                logger.info(f"Screenshot saved: {filepath.name}")
+                
+            except Exception as e:
+                logger.error(f"Failed to save screenshot {filepath.name}: {str(e)}")
+            finally:
+                self._screenshot_queue.task_done()
+    
+    def flush_screenshots(self):
+        """Block until every queued screenshot has been written"""
+        self._screenshot_queue.join()
+    
+    def get_screen_hash(self, root=None):
+        """Get hash of current screen (or of an already parsed root) for duplicate detection"""
         try:
-            root = self.get_ui_hierarchy()
-            if root is None:
-                return None
-            
-            # Create hash from element structure
-            elements = self.extract_elements(root)
-            screen_signature = ""
-            
-            for elem in elements:
-                screen_signature += f"{elem['type']}_{elem['resource_id']}_{elem['text']}_"
+            if root is None or root is self._cached_root:
+                if self._cached_root is not None and self._cached_hash is not None:
+                    return self._cached_hash
+                
+                root = self._cached_root
+                if root is None:
+                    root = self.get_ui_hierarchy()
+                if root is None:
+                    return None
+                
+                self._cached_hash = self._hash_root(root)
+                return self._cached_hash
             
-            screen_hash = hashlib.md5(screen_signature.encode()).hexdigest()
-            return screen_hash
+            return self._hash_root(root)
             
         except Exception as e:
             logger.error(f"Failed to get screen hash: {str(e)}")
             return None
     
-    def is_new_screen(self):
-        """Check if current screen is new"""
-        screen_hash = self.get_screen_hash()
+    def _hash_root(self, root):
+        """Hash a parsed UI hierarchy by its structure, ignoring text"""
+        return self._tree_hash(root)
+    
+    def _tree_hash(self, node):
+        """Bottom-up structural hash: node tag plus its sorted child hashes"""
+        tag = f"{node.get('class', node.tag)}#{node.get('resource-id', '')}"
+        child_hashes = [self._tree_hash(child) for child in node]
+        
+        # List items repeat the same structure; count each distinct row once
+        # so scrolling or loading more rows does not look like a new screen
+        class_name = node.get('class', '')
+        if 'ListView' in class_name or 'RecyclerView' in class_name:
+            child_hashes = set(child_hashes)
+        
+        signature = tag + "|" + "|".join(sorted(child_hashes))
+        return _digest(signature)
+    
+    def wait_until_settled(self, min_interval=0.05, max_interval=0.4, max_wait=None):
+        """Wait until two consecutive UI dumps match; returns the last parsed root"""
+        if max_wait is None:
+            max_wait = self.settle_timeout
+        
+        deadline = time.monotonic() + max_wait
+        interval = min_interval
+        previous_hash = None
+        
+        while True:
+            root = self.get_ui_hierarchy()
+            current_hash = self._hash_root(root) if root is not None else None
+            
+            if current_hash is not None and current_hash == previous_hash:
+                self._cached_hash = current_hash
+                return root
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.debug("UI did not settle before timeout")
+                return root
+            
+            # Back off between dumps: 50ms, 100ms, 200ms, 400ms, ...
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
+            previous_hash = current_hash
+    
+    def is_new_screen(self, root=None):
+        """Check if current screen (or an already parsed root) is new"""
+        screen_hash = self.get_screen_hash(root)
         if screen_hash and screen_hash not in self.visited_screens:
             self.visited_screens.add(screen_hash)
             self.current_screen_hash = screen_hash
@@ -172,19 +308,19 @@ class UIExplorer:
         self.current_screen_hash = screen_hash
         return False
     
+    def invalidate_cache(self):
+        """Forget the cached hierarchy after anything that may change the screen"""
+        self._cached_root = None
+        self._cached_hash = None
+    
     def tap_element(self, element):
         """Tap on an element"""
+        self.invalidate_cache()
         try:
             x, y = element['center']
             logger.debug(f"Tapping at ({x}, {y}): {element['text'] or element['content_desc']}")
             
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "input", "tap", str(x), str(y)],
-                capture_output=True,
-                timeout=5
-            )
-            
-            time.sleep(self.config['testing']['screenshot_delay'])
+            self._send(f"input tap {x} {y}")
             return True
             
         except Exception as e:
@@ -198,27 +334,23 @@ class UIExplorer:
             self.tap_element(element)
             time.sleep(0.5)
             
-            # Clear existing text
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "input", "keyevent", "KEYCODE_MOVE_END"],
-                capture_output=True,
-                timeout=5
-            )
-            
-            for _ in range(50):  # Clear up to 50 characters
-                subprocess.run(
-                    ["adb", "-s", self.device_id, "shell", "input", "keyevent", "KEYCODE_DEL"],
-                    capture_output=True,
-                    timeout=5
-                )
+            # Clear existing text: select all (CTRL+A) and delete it in one go.
+            # Older `input` tools reject keycombination yet still exit 0, so
+            # the API level decides rather than the return code
+            if self._api_level() >= 31:
+                self._send("input keycombination 113 29")
+                self._send("input keyevent KEYCODE_DEL")
+            else:
+                # Before Android 12: delete from the end instead, as many
+                # characters as the field is known to hold
+                count = len(element.get('text', '')) or 50
+                self._send("input keyevent KEYCODE_MOVE_END")
+                self._send("input keyevent " + " ".join(["KEYCODE_DEL"] * count), timeout=15)
             
             # Input new text
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "input", "text", text.replace(" ", "%s")],
-                capture_output=True,
-                timeout=5
-            )
+            self._send(f"input text {shlex.quote(text.replace(' ', '%s'))}")
             
+            self.invalidate_cache()
             logger.debug(f"Input text: {text}")
             time.sleep(0.5)
             return True
@@ -229,13 +361,9 @@ class UIExplorer:
     
     def press_back(self):
         """Press back button"""
+        self.invalidate_cache()
         try:
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "input", "keyevent", "KEYCODE_BACK"],
-                capture_output=True,
-                timeout=5
-            )
-            time.sleep(1)
+            self._send("input keyevent KEYCODE_BACK")
             return True
         except Exception as e:
             logger.error(f"Failed to press back: {str(e)}")
@@ -243,15 +371,17 @@ class UIExplorer:
     
     def scroll_down(self):
         """Scroll down on screen"""
+        self.invalidate_cache()
         try:
-            subprocess.run(
-                ["adb", "-s", self.device_id, "shell", "input", "swipe", 
-                 "500", "1000", "500", "300", "300"],
-                capture_output=True,
-                timeout=5
-            )
-            time.sleep(1)
+            if self.scrollables:
+                # Swipe up through the middle of the largest scroll container
+                x1, y1, x2, y2 = max(self.scrollables, key=lambda r: (r[2] - r[0]) * (r[3] - r[1]))
+                x = (x1 + x2) // 2
+                height = y2 - y1
+                self._send(f"input swipe {x} {y1 + height * 4 // 5} {x} {y1 + height // 5} 300")
+            else:
+                self._send("input swipe 500 1000 500 300 300")
             return True
         except Exception as e:
             logger.error(f"Failed to scroll: {str(e)}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,102 @@
+"""
+Utilities - Shared helpers for device interaction
+"""
+import queue
+import subprocess
+import threading
+import time
+
+def wait_until(predicate, timeout, interval=0.25):
+    """Poll predicate until it returns True or timeout (seconds) expires"""
+    deadline = time.monotonic() + timeout
+    
+    while True:
+        if predicate():
+            return True
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        
+        time.sleep(min(interval, remaining))
+
+class AdbShell:
+    """Long-lived `adb shell` session that streams commands over stdin"""
+    SENTINEL = "__END__"
+    
+    def __init__(self, adb_prefix):
+        self.adb_prefix = adb_prefix
+        self.process = None
+        self._lines = None
+        self._lock = threading.Lock()
+    
+    def _open(self):
+        """Start the shell process and a reader thread draining its stdout"""
+        self.process = subprocess.Popen(
+            [*self.adb_prefix, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding="utf-8",
+            errors="ignore",
+            bufsize=1
+        )
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=self._drain,
+            args=(self.process.stdout, self._lines),
+            daemon=True
+        ).start()
+    
+    @staticmethod
+    def _drain(stream, lines):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)  # EOF: the shell has exited
+    
+    def run(self, cmd, timeout=10):
+        """Run a command in the shell and wait for its sentinel-delimited output"""
+        with self._lock:
+            # The device may not be up yet when the installer is created,
+            # so the session is opened on first use and reopened if it died
+            if self.process is None or self.process.poll() is not None:
+                self._open()
+            
+            self.process.stdin.write(f"{cmd}; echo {self.SENTINEL}$?\n")
+            self.process.stdin.flush()
+            
+            deadline = time.monotonic() + timeout
+            output = []
+            while True:
+                try:
+                    line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self.close()
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+                
+                if line is None:
+                    # Reap it now so the next call opens a fresh session
+                    # instead of writing to a shell that has not exited yet
+                    self.close()
+                    raise RuntimeError(f"adb shell exited while running: {cmd}")
+                
+                # The sentinel may share a line with output lacking a trailing newline
+                index = line.find(self.SENTINEL)
+                if index == -1:
+                    output.append(line)
+                    continue
+                
+                output.append(line[:index])
+                returncode = int(line[index + len(self.SENTINEL):].strip() or 1)
+                return subprocess.CompletedProcess(cmd, returncode, "".join(output), "")
+    
+    def close(self):
+        """Terminate the shell session"""
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.terminate()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+        self.process = None
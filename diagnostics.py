@@ -0,0 +1,148 @@
+"""
+Diagnostics - Environment probes shared by setup.py and quick_fix_check.py
+"""
+import contextlib
+import functools
+import io
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+# Rule printed above and below section headers
+BAR = "=" * 60
+
+@contextlib.contextmanager
+def buffered_output():
+    """Collect everything printed in the block and write it to stdout in one call"""
+    stdout = sys.stdout
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            yield
+    finally:
+        stdout.write(buffer.getvalue())
+        stdout.flush()
+
+def run_quick(args, timeout):
+    """Run a short-lived tool and return (returncode, stdout); kills it on timeout"""
+    import subprocess
+    
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        close_fds=False,
+        text=True
+    )
+    try:
+        stdout, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+    return process.returncode, stdout
+
+@functools.lru_cache(maxsize=None)
+def find_command(command):
+    """Path of a command on PATH, or None; a PATH scan, no process launch"""
+    return shutil.which(command)
+
+@functools.lru_cache(maxsize=None)
+def probe_command(command, timeout=1):
+    """Run `<command> --version` once; returns (returncode or None if not found, error or None)"""
+    import subprocess
+    
+    try:
+        # A version query answers almost instantly, and only its exit status
+        # matters: no pipes, no decoding, and no close_fds handle scrubbing,
+        # which makes spawning slow on Windows
+        result = subprocess.run(
+            [command, "--version"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=False,
+            timeout=timeout
+        )
+        return result.returncode, None
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        return None, str(e)
+
+@functools.lru_cache(maxsize=None)
+def android_home():
+    """ANDROID_HOME as a Path (or None) and whether it exists, looked up once"""
+    value = os.environ.get('ANDROID_HOME')
+    path = Path(value) if value else None
+    return path, path is not None and path.exists()
+
+# AVD names from earlier runs, reused while the emulator and AVD folder are unchanged
+_AVD_CACHE = Path.home() / ".cache" / "mta" / "avds.json"
+
+def _avd_home():
+    """Directory where the emulator keeps AVD definitions"""
+    if os.environ.get('ANDROID_AVD_HOME'):
+        return Path(os.environ['ANDROID_AVD_HOME'])
+    user_home = os.environ.get('ANDROID_USER_HOME')
+    return Path(user_home) / "avd" if user_home else Path.home() / ".android" / "avd"
+
+def _avd_stamp(emulator):
+    """Modification times that change when the emulator or the AVD set changes"""
+    stamp = [os.stat(emulator).st_mtime_ns]
+    try:
+        stamp.append(os.stat(_avd_home()).st_mtime_ns)
+    except OSError:
+        stamp.append(None)
+    return stamp
+
+@functools.lru_cache(maxsize=None)
+def list_avds():
+    """Names of the available AVDs, or None if the emulator command is not found"""
+    emulator = find_command("emulator")
+    if emulator is None:
+        return None
+    
+    stamp = _avd_stamp(emulator)
+    try:
+        cached = json.loads(_AVD_CACHE.read_text())
+        if cached['stamp'] == stamp:
+            return cached['avds']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    try:
+        # Listing AVDs can take several seconds on a cold start, so it keeps
+        # the generous limit the diagnostics scripts always gave it
+        returncode, stdout = run_quick([emulator, "-list-avds"], timeout=10)
+    except FileNotFoundError:
+        return None
+    avds = [avd for avd in map(str.strip, stdout.splitlines()) if avd]
+    
+    # A failed listing is not remembered, or it would hide the AVDs until
+    # the emulator or AVD folder happened to change
+    if returncode != 0:
+        return avds
+    
+    # Write to a temporary file and rename so readers never see a partial cache
+    try:
+        _AVD_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _AVD_CACHE.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({'stamp': stamp, 'avds': avds}))
+        os.replace(tmp, _AVD_CACHE)
+    except OSError:
+        pass
+    
+    return avds
+
+def clear_cache():
+    """Forget cached results, including the saved AVD list, so the next call probes again"""
+    find_command.cache_clear()
+    probe_command.cache_clear()
+    android_home.cache_clear()
+    list_avds.cache_clear()
+    try:
+        _AVD_CACHE.unlink()
+    except OSError:
+        pass
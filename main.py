@@ -4,6 +4,7 @@ Main Application - Entry point for the testing agent
 import yaml
 import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from loguru import logger
 
@@ -119,6 +120,11 @@ Examples:
     test_executor = TestExecutor(config, ui_explorer, apk_installer)
     report_generator = ReportGenerator(config)
     
+    # Parsing the APK is host-side only, so it overlaps with the emulator boot
+    executor = ThreadPoolExecutor(max_workers=1)
+    prepare_future = executor.submit(apk_installer.prepare, args.apk)
+    executor.shutdown(wait=False)
+    
     try:
         # Step 1: Start emulator
         if not args.skip_emulator:
@@ -134,14 +140,12 @@ Examples:
         
         # Step 2: Install APK
         logger.info("\n📦 Step 2: Installing APK...")
+        prepare_future.result()
         if not apk_installer.install(args.apk):
             logger.error("Failed to install APK. Exiting.")
             emulator.stop()
             sys.exit(1)
         
-        # Grant permissions
-        apk_installer.grant_permissions()
-        
         # Step 3: Run tests
         logger.info("\n🧪 Step 3: Running Automated Tests...")
         test_summary = test_executor.run_tests(documentation)
@@ -170,6 +174,8 @@ Examples:
         # Cleanup
         logger.info("\n🧹 Cleaning up...")
         apk_installer.stop()
+        apk_installer.close()
+        ui_explorer.close()
         
         if not args.skip_emulator:
             emulator.stop()
@@ -179,6 +185,8 @@ Examples:
     except KeyboardInterrupt:
         logger.warning("\n\n⚠️  Testing interrupted by user")
         apk_installer.stop()
+        apk_installer.close()
+        ui_explorer.close()
         if not args.skip_emulator:
             emulator.stop()
         sys.exit(0)
@@ -187,6 +195,8 @@ Examples:
         logger.error(f"\n❌ An error occurred: {str(e)}")
         logger.exception("Full error details:")
         apk_installer.stop()
+        apk_installer.close()
+        ui_explorer.close()
         if not args.skip_emulator:
             emulator.stop()
         sys.exit(1)
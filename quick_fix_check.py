@@ -3,103 +3,129 @@ Quick Fix Verification Script
 Run this after setting environment variables
 """
 import os
-import subprocess
+import shutil
 import sys
 
-print("=" * 60)
-print("🔧 Environment Fix Verification")
-print("=" * 60)
+import diagnostics
+
+def _snapshot(path):
+    """Read a directory once into {name: DirEntry}; None if it can't be read"""
+    try:
+        with os.scandir(path) as it:
+            return {entry.name: entry for entry in it}
+    except OSError:
+        return None
+
+with diagnostics.buffered_output():
+    print(diagnostics.BAR)
+    print("🔧 Environment Fix Verification")
+    print(diagnostics.BAR)
 
 # Check ANDROID_HOME
-print("\n1. Checking ANDROID_HOME...")
-android_home = os.environ.get('ANDROID_HOME')
-if android_home:
-    print(f"   ✅ ANDROID_HOME = {android_home}")
-    
-    # Check if path exists
-    if os.path.exists(android_home):
-        print(f"   ✅ Path exists")
+with diagnostics.buffered_output():
+    print("\n1. Checking ANDROID_HOME...")
+    android_home, _ = diagnostics.android_home()
+    if android_home:
+        print(f"   ✅ ANDROID_HOME = {android_home}")
+        
+        # Check if path exists; its listing is reused by the checks below
+        android_entries = _snapshot(android_home)
+        if android_entries is not None:
+            print(f"   ✅ Path exists")
+        else:
+            print(f"   ❌ Path does not exist!")
+            print(f"   Please check the path: {android_home}")
     else:
-        print(f"   ❌ Path does not exist!")
-        print(f"   Please check the path: {android_home}")
-else:
-    print("   ❌ ANDROID_HOME not found!")
-    print("\n   SOLUTION:")
-    print("   1. Close PowerShell completely")
-    print("   2. Reopen PowerShell")
-    print("   3. Run this script again")
-    sys.exit(1)
+        print("   ❌ ANDROID_HOME not found!")
+        print("\n   SOLUTION:")
+        print("   1. Close PowerShell completely")
+        print("   2. Reopen PowerShell")
+        print("   3. Run this script again")
+        sys.exit(1)
+
+# SDK locations used below, built once from the ANDROID_HOME path
+emulator_home = android_home / 'emulator'
+platform_tools = android_home / 'platform-tools'
 
 # Check emulator
-print("\n2. Checking emulator...")
-emulator_path = os.path.join(android_home, 'emulator', 'emulator.exe')
-if os.path.exists(emulator_path):
-    print(f"   ✅ Emulator found at: {emulator_path}")
-else:
-    print(f"   ❌ Emulator not found at: {emulator_path}")
+with diagnostics.buffered_output():
+    print("\n2. Checking emulator...")
+    emulator_path = emulator_home / 'emulator.exe'
+    emulator_dir = (android_entries or {}).get('emulator')
+    emulator_entries = _snapshot(emulator_dir.path) if emulator_dir and emulator_dir.is_dir() else None
+    emulator_found = bool(emulator_entries) and 'emulator.exe' in emulator_entries
+    if emulator_found:
+        print(f"   ✅ Emulator found at: {emulator_path}")
+    else:
+        print(f"   ❌ Emulator not found at: {emulator_path}")
 
 # Check ADB
-print("\n3. Checking ADB...")
-try:
-    result = subprocess.run(
-        ["adb", "version"],
-        capture_output=True,
-        text=True,
-        timeout=5
-    )
-    if result.returncode == 0:
-        print("   ✅ ADB is working")
+with diagnostics.buffered_output():
+    print("\n3. Checking ADB...")
+    adb_name = 'adb.exe' if os.name == 'nt' else 'adb'
+    adb_path = platform_tools / adb_name
+    tools_dir = (android_entries or {}).get('platform-tools')
+    tools_entries = _snapshot(tools_dir.path) if tools_dir and tools_dir.is_dir() else None
+    
+    # A binary in the SDK only needs a PATH lookup, not a process launch
+    if tools_entries and adb_name in tools_entries:
+        if shutil.which('adb'):
+            print(f"   ✅ ADB found at: {adb_path}")
+        else:
+            print(f"   ❌ ADB not in PATH")
+            print(f"\n   Add this to System PATH:")
+            print(f"   {platform_tools}")
     else:
-        print("   ❌ ADB failed")
-except FileNotFoundError:
-    print("   ❌ ADB not in PATH")
-    print(f"\n   Add this to System PATH:")
-    print(f"   {os.path.join(android_home, 'platform-tools')}")
-except Exception as e:
-    print(f"   ❌ Error: {str(e)}")
+        returncode, error = diagnostics.probe_command("adb", timeout=5)
+        if returncode == 0:
+            print("   ✅ ADB is working")
+        elif error:
+            print(f"   ❌ Error: {error}")
+        elif returncode is None:
+            print("   ❌ ADB not in PATH")
+            print(f"\n   Add this to System PATH:")
+            print(f"   {platform_tools}")
+        else:
+            print("   ❌ ADB failed")
 
 # Check available emulators
-print("\n4. Checking available emulators...")
-try:
-    result = subprocess.run(
-        ["emulator", "-list-avds"],
-        capture_output=True,
-        text=True,
-        timeout=10
-    )
-    avds = [line.strip() for line in result.stdout.strip().split('\n') if line.strip()]
-    
-    if avds:
-        print("   ✅ Found emulators:")
-        for avd in avds:
-            print(f"      - {avd}")
+with diagnostics.buffered_output():
+    print("\n4. Checking available emulators...")
+    try:
+        avds = diagnostics.list_avds()
         
-        print(f"\n   📝 Update config.yaml with one of these names")
-    else:
-        print("   ❌ No emulators found")
-        print("\n   Create one in Android Studio:")
-        print("   Tools → Device Manager → Create Device")
-        
-except FileNotFoundError:
-    print("   ❌ Emulator command not found")
-    print(f"\n   Add this to System PATH:")
-    print(f"   {os.path.join(android_home, 'emulator')}")
-except Exception as e:
-    print(f"   ❌ Error: {str(e)}")
-
-print("\n" + "=" * 60)
-print("Next Steps:")
-print("=" * 60)
-
-if android_home and os.path.exists(emulator_path):
-    print("✅ Environment is configured correctly!")
-    print("\nYou can now run:")
-    print("   python main.py --apk tests/sample_apks/your_app.apk")
-else:
-    print("⚠️  Please complete the setup steps above")
-    print("\nIf you just set environment variables:")
-    print("1. Close ALL PowerShell/Command Prompt windows")
-    print("2. Open a NEW PowerShell window")
-    print("3. Run this script again")
+        if avds is None:
+            print("   ❌ Emulator command not found")
+            print(f"\n   Add this to System PATH:")
+            print(f"   {emulator_home}")
+        elif avds:
+            print("   ✅ Found emulators:")
+            for avd in avds:
+                print(f"      - {avd}")
+            
+            print(f"\n   📝 Update config.yaml with one of these names")
+        else:
+            print("   ❌ No emulators found")
+            print("\n   Create one in Android Studio:")
+            print("   Tools → Device Manager → Create Device")
+            
+    except Exception as e:
+        print(f"   ❌ Error: {str(e)}")
 
-print("=" * 60)
\ No newline at end of file
+with diagnostics.buffered_output():
+    print(f"\n{diagnostics.BAR}")
+    print("Next Steps:")
+    print(diagnostics.BAR)
+    
+    if android_home and emulator_found:
+        print("✅ Environment is configured correctly!")
+        print("\nYou can now run:")
+        print("   python main.py --apk tests/sample_apks/your_app.apk")
+    else:
+        print("⚠️  Please complete the setup steps above")
+        print("\nIf you just set environment variables:")
+        print("1. Close ALL PowerShell/Command Prompt windows")
+        print("2. Open a NEW PowerShell window")
+        print("3. Run this script again")
+    
+    print(diagnostics.BAR)
\ No newline at end of file
@@ -2,20 +2,42 @@
 Setup script for Automated Mobile App Testing Agent
 Helps verify installation and setup
 """
+import functools
+import io
 import os
 import sys
-import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import diagnostics
+
+class _ThreadOutput(io.TextIOBase):
+    """stdout stand-in that sends each worker thread's prints to its own buffer"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def write(self, text):
+        return getattr(self.local, 'buffer', self.stream).write(text)
+    
+    def flush(self):
+        getattr(self.local, 'buffer', self.stream).flush()
+
+def _run_buffered(output, check):
+    """Run a check with its output captured; returns (result, printed text)"""
+    output.local.buffer = io.StringIO()
+    try:
+        return check(), output.local.buffer.getvalue()
+    finally:
+        del output.local.buffer
+
 def print_header(text):
     """Print formatted header"""
-    print("\n" + "="*60)
-    print(f"  {text}")
-    print("="*60)
+    print(f"\n{diagnostics.BAR}\n  {text}\n{diagnostics.BAR}")
 
 def check_python():
     """Check Python version"""
-    print("\n📦 Checking Python version...")
     version = sys.version_info
     if version.major >= 3 and version.minor >= 9:
         print(f"✅ Python {version.major}.{version.minor}.{version.micro} - OK")
@@ -24,50 +46,34 @@ def check_python():
         print(f"❌ Python {version.major}.{version.minor} - Need 3.9+")
         return False
 
-def check_command(command, name):
-    """Check if command exists"""
-    try:
-        result = subprocess.run(
-            [command, "--version"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            print(f"✅ {name} - OK")
-            return True
-        else:
-            print(f"❌ {name} - Not found")
-            return False
-    except FileNotFoundError:
+def check_command(command, name, deep=False):
+    """Check if command exists (and, if deep, that it runs)"""
+    path = diagnostics.find_command(command)
+    if not path:
         print(f"❌ {name} - Not found")
         return False
-    except Exception as e:
-        print(f"❌ {name} - Error: {str(e)}")
-        return False
-
-def check_adb():
-    """Check ADB"""
-    print("\n🔧 Checking ADB (Android Debug Bridge)...")
-    return check_command("adb", "ADB")
-
-def check_aapt():
-    """Check AAPT"""
-    print("\n🔧 Checking AAPT (Android Asset Packaging Tool)...")
-    return check_command("aapt", "AAPT")
+    
+    if deep:
+        returncode, error = diagnostics.probe_command(command)
+        if error:
+            print(f"❌ {name} - Error: {error}")
+            return False
+        elif returncode != 0:
+            print(f"❌ {name} - Found at {path} but failed to run")
+            return False
+    
+    print(f"✅ {name} - OK ({path})")
+    return True
 
 def check_emulator():
     """Check Android Emulator"""
-    print("\n📱 Checking Android Emulator...")
     try:
-        result = subprocess.run(
-            ["emulator", "-list-avds"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        avds = result.stdout.strip().split('\n')
-        if avds and avds[0]:
+        avds = diagnostics.list_avds()
+        if avds is None:
+            print("❌ Emulator command not found")
+            return False
+        
+        if avds:
             print(f"✅ Found {len(avds)} emulator(s):")
             for avd in avds:
                 print(f"   - {avd}")
@@ -75,20 +81,16 @@ def check_emulator():
         else:
             print("❌ No emulators found")
             return False
-    except FileNotFoundError:
-        print("❌ Emulator command not found")
-        return False
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         return False
 
 def check_android_home():
     """Check ANDROID_HOME environment variable"""
-    print("\n🌍 Checking ANDROID_HOME...")
-    android_home = os.environ.get('ANDROID_HOME')
+    android_home, exists = diagnostics.android_home()
     if android_home:
         print(f"✅ ANDROID_HOME: {android_home}")
-        if Path(android_home).exists():
+        if exists:
             print("✅ Directory exists")
             return True
         else:
@@ -98,97 +100,152 @@ def check_android_home():
         print("❌ ANDROID_HOME not set")
         return False
 
-def check_directories():
+def check_directories(dirs):
     """Check required directories"""
-    print("\n📁 Checking directories...")
-    dirs = ['app', 'config', 'tests', 'reports', 'screenshots']
     all_ok = True
     
+    # One listing of the project root instead of a stat per directory
+    with os.scandir('.') as it:
+        present = {entry.name for entry in it if entry.is_dir()}
+    
     for dir_name in dirs:
-        dir_path = Path(dir_name)
-        if dir_path.exists():
+        if dir_name in present:
             print(f"✅ {dir_name}/ - OK")
         else:
             print(f"❌ {dir_name}/ - Missing (creating...)")
-            dir_path.mkdir(exist_ok=True)
+            os.makedirs(dir_name, exist_ok=True)
             all_ok = False
     
     return all_ok
 
-def check_config():
+def check_config(config_file):
     """Check configuration file"""
-    print("\n⚙️  Checking configuration...")
-    config_path = Path("config/config.yaml")
+    config_path = Path(config_file)
     if config_path.exists():
-        print("✅ config.yaml - OK")
+        print(f"✅ {config_path.name} - OK")
         return True
     else:
-        print("❌ config.yaml - Missing")
+        print(f"❌ {config_path.name} - Missing")
         return False
 
+# Diagnostic checks in report order: (summary name, heading, kind, argument)
+_CHECKS = [
+    ("Python", "📦 Checking Python version...", "python", None),
+    ("ADB", "🔧 Checking ADB (Android Debug Bridge)...", "command", "adb"),
+    ("AAPT", "🔧 Checking AAPT (Android Asset Packaging Tool)...", "command", "aapt"),
+    ("Emulator", "📱 Checking Android Emulator...", "emulator", None),
+    ("ANDROID_HOME", "🌍 Checking ANDROID_HOME...", "android_home", None),
+    ("Directories", "📁 Checking directories...", "directories", ['app', 'config', 'tests', 'reports', 'screenshots']),
+    ("Config", "⚙️  Checking configuration...", "file", "config/config.yaml"),
+]
+
+def run_check(name, heading, kind, arg, deep=False):
+    """Print a check's heading and run it by kind; returns True if it passed"""
+    print(f"\n{heading}")
+    if kind == "command":
+        return check_command(arg, name, deep)
+    elif kind == "python":
+        return check_python()
+    elif kind == "emulator":
+        return check_emulator()
+    elif kind == "android_home":
+        return check_android_home()
+    elif kind == "directories":
+        return check_directories(arg)
+    elif kind == "file":
+        return check_config(arg)
+    raise ValueError(f"Unknown check kind: {kind}")
+
+# Hash of requirements.txt from the last successful install
+_REQ_STAMP = Path(".req-hash")
+
 def install_dependencies():
     """Install Python dependencies"""
     print("\n📦 Installing Python dependencies...")
+    
+    # Only needed on the --install path, so not imported at startup
+    import hashlib
+    import subprocess
+    
     try:
+        # Key on the interpreter too, so switching virtualenvs still installs
+        digest = hashlib.sha256(Path("requirements.txt").read_bytes())
+        digest.update(sys.executable.encode())
+        req_hash = digest.hexdigest()
+        
+        if _REQ_STAMP.exists() and _REQ_STAMP.read_text() == req_hash:
+            print("✅ Dependencies up to date")
+            return True
+        
         subprocess.run(
             [sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
             check=True
         )
+        _REQ_STAMP.write_text(req_hash)
         print("✅ Dependencies installed")
         return True
     except Exception as e:
         print(f"❌ Failed to install dependencies: {str(e)}")
         return False
 
-def run_diagnostics():
+def run_diagnostics(deep=False):
     """Run all diagnostic checks"""
     print_header("🔍 Automated Mobile App Testing Agent - Setup Verification")
     
-    results = {
-        "Python": check_python(),
-        "ADB": check_adb(),
-        "AAPT": check_aapt(),
-        "Emulator": check_emulator(),
-        "ANDROID_HOME": check_android_home(),
-        "Directories": check_directories(),
-        "Config": check_config()
-    }
-    
-    print_header("📊 Summary")
-    
-    passed = sum(results.values())
-    total = len(results)
-    
-    for name, status in results.items():
-        status_str = "✅ PASS" if status else "❌ FAIL"
-        print(f"{name:20} {status_str}")
-    
-    print(f"\nScore: {passed}/{total} checks passed")
+    # The checks are independent and mostly wait on subprocesses, so run them
+    # together; each one's output is buffered and printed in table order
+    output = _ThreadOutput(sys.stdout)
+    sys.stdout = output
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=len(_CHECKS)) as executor:
+            futures = {
+                row[0]: executor.submit(_run_buffered, output, functools.partial(run_check, *row, deep=deep))
+                for row in _CHECKS
+            }
+            for name, future in futures.items():
+                results[name], text = future.result()
+                print(text, end="")
+    finally:
+        sys.stdout = output.stream
     
-    if passed == total:
-        print("\n✨ All checks passed! You're ready to go!")
-        print("\nRun your first test:")
-        print("  python main.py --apk your_app.apk")
-    else:
-        print("\n⚠️  Some checks failed. Please fix the issues above.")
-        print("\nCommon fixes:")
+    # Emit the summary in one write rather than a console call per line
+    with diagnostics.buffered_output():
+        print_header("📊 Summary")
+        
+        passed = sum(results.values())
+        total = len(results)
         
-        if not results["ANDROID_HOME"]:
-            print("\n1. Set ANDROID_HOME:")
-            print("   export ANDROID_HOME=$HOME/Android/Sdk  # Linux/macOS")
-            print("   setx ANDROID_HOME \"C:\\Android\\Sdk\"  # Windows")
+        for name, status in results.items():
+            status_str = "✅ PASS" if status else "❌ FAIL"
+            print(f"{name:20} {status_str}")
         
-        if not results["ADB"] or not results["AAPT"]:
-            print("\n2. Add Android SDK to PATH:")
-            print("   export PATH=$PATH:$ANDROID_HOME/platform-tools")
-            print("   export PATH=$PATH:$ANDROID_HOME/build-tools/33.0.0")
+        print(f"\nScore: {passed}/{total} checks passed")
         
-        if not results["Emulator"]:
-            print("\n3. Create an emulator:")
-            print("   - Open Android Studio")
-            print("   - Tools → AVD Manager")
-            print("   - Create Virtual Device")
-            print("   - Name it: test_device")
+        if passed == total:
+            print("\n✨ All checks passed! You're ready to go!")
+            print("\nRun your first test:")
+            print("  python main.py --apk your_app.apk")
+        else:
+            print("\n⚠️  Some checks failed. Please fix the issues above.")
+            print("\nCommon fixes:")
+            
+            if not results["ANDROID_HOME"]:
+                print("\n1. Set ANDROID_HOME:")
+                print("   export ANDROID_HOME=$HOME/Android/Sdk  # Linux/macOS")
+                print("   setx ANDROID_HOME \"C:\\Android\\Sdk\"  # Windows")
+            
+            if not results["ADB"] or not results["AAPT"]:
+                print("\n2. Add Android SDK to PATH:")
+                print("   export PATH=$PATH:$ANDROID_HOME/platform-tools")
+                print("   export PATH=$PATH:$ANDROID_HOME/build-tools/33.0.0")
+            
+            if not results["Emulator"]:
+                print("\n3. Create an emulator:")
+                print("   - Open Android Studio")
+                print("   - Tools → AVD Manager")
+                print("   - Create Virtual Device")
+                print("   - Name it: test_device")
 
 def main():
     """Main function"""
@@ -200,13 +257,26 @@ def main():
         action='store_true',
         help='Install Python dependencies'
     )
+    parser.add_argument(
+        '--deep',
+        action='store_true',
+        help='Also run each tool to verify it works, not just that it is on PATH'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Re-probe tools and environment instead of using cached results'
+    )
     
     args = parser.parse_args()
     
+    if args.refresh:
+        diagnostics.clear_cache()
+    
     if args.install:
         install_dependencies()
     
-    run_diagnostics()
+    run_diagnostics(deep=args.deep)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file